@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+lazy WebDriver provider
+the browser is only started when a test or page object first calls into the driver,
+so tests (and xdist workers) that never touch a browser never pay for starting one
+"""
+from utils.logger import log
+
+
+class LazyDriver(object):
+    """proxy of a WebDriver, the real driver is created by factory() on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._driver = None
+        # the test that is running now, set by conftest
+        self.current_test = None
+        # tests that really called into the driver
+        self.used_by = set()
+
+    @property
+    def started(self):
+        return self._driver is not None
+
+    def get(self):
+        """the real driver, started if needed"""
+        if self._driver is None:
+            log.info(f"starting the browser for: {self.current_test}")
+            self._driver = self._factory()
+        if self.current_test is not None:
+            self.used_by.add(self.current_test)
+        return self._driver
+
+    def __getattr__(self, name):
+        # only called for attributes the proxy does not have itself
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def quit(self):
+        """quit the browser if it was ever started"""
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
 import configparser
+import functools
+
 from config.path_manager import pm
+from config.settings import get_settings
 
 
 class ReadConfig(object):
-    """配置文件"""
+    """配置文件, 读取走config.settings的快照, 只有_get/_set才解析config.ini"""
 
-    def __init__(self):
-        self.config = configparser.RawConfigParser()  # 当有%的符号时请使用Raw读取
-        self.config.read(pm.ini_file, encoding='utf-8')
+    @functools.cached_property
+    def config(self):
+        config = configparser.RawConfigParser()  # 当有%的符号时请使用Raw读取
+        config.read(pm.ini_file, encoding='utf-8')
+        return config
 
     def _get(self, section, option):
         """获取"""
@@ -23,14 +28,14 @@ class ReadConfig(object):
 
     @property
     def url(self):
-        return self._get('HOST', 'host')
+        return get_settings().host
 
     def allure_env(self, args):
-        return self._get('ALLURE_ENVIRONMENT', args)
+        return get_settings().allure_env[args]
 
 
 ini = ReadConfig()
 
 if __name__ == '__main__':
     print(ini.url)
-    print(ini.allure_env('email'))
+    print(ini.allure_env('author'))
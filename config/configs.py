@@ -25,6 +25,13 @@ CHROME_START_HEIGHT = 840
 HEADLESS_START_WIDTH = 1440
 HEADLESS_START_HEIGHT = 1880
 
+# Logging settings used by utils/logger.py
+# (Records below LOG_LEVEL are dropped before they are created/formatted.)
+# (The log file rolls over at LOG_MAX_BYTES and old files are gzipped.)
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
 # basic type of the element locator
 LOCATE_MODE = {
     'id': 'id',
@@ -1,12 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
+import functools
+import itertools
 import os
+import shutil
 import sys
+import tempfile
+import uuid
 
 from utils.time import dt_strftime
 
+# 本次运行的ID, 主进程生成后通过环境变量传给xdist的worker
+RUN_ID = os.environ.setdefault("PYTEST_DEMO_RUN_ID", "%s-%s" % (dt_strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex[:6]))
+
+# 产物文件名的序号, 保证同一秒内生成的文件不会互相覆盖
+_artifact_seq = itertools.count(1)
+
 
 class PathManager(object):
+    # xdist worker id ("gw0", "gw1"...), "master" when not running in parallel
+    WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "master")
+
     # project directory
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -15,6 +29,8 @@ class PathManager(object):
 
     # page element directory
     ELEMENT_PATH = os.path.join(BASE_DIR, "page_element")
+    # cache of the locator lint results, keyed by file hash
+    LOCATOR_LINT_CACHE = os.path.join(BASE_DIR, ".cache", "locator_lint.json")
 
     # report directory
     REPORT_PATH = os.path.join(BASE_DIR, "reports")
@@ -36,6 +52,10 @@ class PathManager(object):
     # allure report history path under allure report
     ALLURE_REPORT_HISTORY = os.path.join(ALLURE_REPORT, "history")
 
+    def __init__(self):
+        # directories already created in this process
+        self._created_dirs = set()
+
     def chrome_executable_path(self, version):
         """driver directory"""
         driver_path = os.path.join(self.BASE_DIR, "driver")
@@ -45,25 +65,109 @@ class PathManager(object):
         else:
             return os.path.join(driver_path, version, "chromedriver")
 
+    @property
+    def is_worker(self):
+        """running inside a xdist worker or not"""
+        return self.WORKER_ID != "master"
+
+    def _ensure_dir(self, _dir):
+        """create the directory once, later calls do not touch the filesystem"""
+        if _dir not in self._created_dirs:
+            os.makedirs(_dir, exist_ok=True)
+            self._created_dirs.add(_dir)
+        return _dir
+
+    def artifact_path(self, kind, ext, scratch=False):
+        """
+        cheap path factory for per-test artifacts, names are collision-free: time + pid + sequence
+        @param kind: artifact kind, also the directory name, e.g. 'screenshots'
+        @param ext: file extension without dot
+        @param scratch: put the file into the RAM backed scratch directory
+        @return: (now_time, file path)
+        """
+        if scratch:
+            _dir = self._ensure_dir(os.path.join(self.scratch_dir, kind))
+        else:
+            _dir = self._ensure_dir(os.path.join(self.BASE_DIR, kind, self.WORKER_ID))
+        now_time = dt_strftime("%Y%m%d%H%M%S")
+        return now_time, os.path.join(_dir, f"{now_time}_{os.getpid()}_{next(_artifact_seq)}.{ext}")
+
     @property
     def screen_path(self):
         """screenshot directory"""
-        screenshot_dir = os.path.join(self.BASE_DIR, 'screenshots')
-        if not os.path.exists(screenshot_dir):
-            os.makedirs(screenshot_dir)
-        now_time = dt_strftime("%Y%m%d%H%M%S")
-        screen_file = os.path.join(screenshot_dir, f"{now_time}.png")
-        return now_time, screen_file
+        return self.artifact_path('screenshots', 'png')
 
     @property
+    def page_source_path(self):
+        """page source directory"""
+        return self.artifact_path('page_sources', 'html')
+
+    @functools.cached_property
+    def scratch_dir(self):
+        """
+        scratch directory for transient artifacts, on tmpfs (/dev/shm) when available,
+        files in it are only copied to disk by persist_scratch() when a test fails
+        """
+        shm = "/dev/shm"
+        root = shm if os.path.isdir(shm) and os.access(shm, os.W_OK) else tempfile.gettempdir()
+        return self._ensure_dir(os.path.join(root, "pytest_demo", RUN_ID, self.WORKER_ID))
+
+    def _scratch_files(self):
+        if "scratch_dir" not in self.__dict__:
+            return  # never used in this process
+        for root, _, files in os.walk(self.scratch_dir):
+            for name in files:
+                yield os.path.join(root, name)
+
+    def persist_scratch(self, name):
+        """
+        copy everything in the scratch directory to artifacts/<worker>/<name> on disk
+        @return: the target directory, None if there was nothing to copy
+        """
+        if next(self._scratch_files(), None) is None:
+            return None
+        target = os.path.join(self.BASE_DIR, 'artifacts', self.WORKER_ID, name)
+        shutil.copytree(self.scratch_dir, target, dirs_exist_ok=True)
+        return target
+
+    def clear_scratch(self):
+        """remove the files in the scratch directory (directories are kept), called after every test"""
+        for path in list(self._scratch_files()):
+            os.remove(path)
+
+    def remove_scratch(self):
+        """drop the scratch directory of this process when the session ends"""
+        scratch_dir = self.__dict__.pop("scratch_dir", None)
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(scratch_dir))  # the run directory, once the last worker is done
+            except OSError:
+                pass
+            self._created_dirs = {d for d in self._created_dirs if not d.startswith(scratch_dir)}
+
+    @functools.cached_property
+    def log_shard_dir(self):
+        """log shards of the xdist workers in this run"""
+        return os.path.join(self.BASE_DIR, 'logs', RUN_ID)
+
+    @functools.cached_property
+    def session_log_file(self):
+        """worker shards are merged into this file when the run ends"""
+        return os.path.join(self.BASE_DIR, 'logs', f'{RUN_ID}.log')
+
+    @functools.cached_property
     def log_file(self):
-        """log directory"""
-        log_dir = os.path.join(self.BASE_DIR, 'logs')
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        return os.path.join(log_dir, f'{dt_strftime()}.log')
+        """log directory, every xdist worker writes its own shard"""
+        if self.is_worker:
+            log_dir = self.log_shard_dir
+            name = f'{self.WORKER_ID}.log'
+        else:
+            log_dir = os.path.join(self.BASE_DIR, 'logs')
+            name = f'{dt_strftime()}.log'
+        return os.path.join(self._ensure_dir(log_dir), name)
 
-    @property
+    @functools.cached_property
     def ini_file(self):
         """read config.ini"""
         ini_file = os.path.join(self.CONFIG_PATH, 'config.ini')
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+分层配置, 优先级从低到高:
+1. config/configs.py 中的默认值
+2. config/config.ini
+3. config/env/<test_env>.ini, 由 --test_env 选择
+4. 环境变量 PYTEST_DEMO_<SECTION>_<OPTION>, 例如 PYTEST_DEMO_TIMEOUTS_LARGE=15
+
+合并结果是一个只读的Settings快照, 每个会话只构建一次,
+xdist的worker直接使用主进程传过来的快照, 不再重新解析
+"""
+import configparser
+import os
+from dataclasses import asdict, dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from config import configs
+from config.path_manager import pm
+
+ENV_PREFIX = "PYTEST_DEMO_"
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    mini: float
+    small: float
+    large: float
+    extreme: float
+    poll_frequency: float
+    page_refresh: float
+
+
+@dataclass(frozen=True)
+class Settings:
+    env: str
+    host: str
+    timeouts: Timeouts
+    # number of xdist workers, 0 means "not set, run in one process unless -n is given"
+    workers: int
+    email: Mapping[str, object]
+    addressee: Tuple[str, ...]
+    allure_env: Mapping[str, str]
+
+    def to_dict(self):
+        """plain dict, used to pass the snapshot to xdist workers"""
+        return {
+            "env": self.env,
+            "host": self.host,
+            "timeouts": asdict(self.timeouts),
+            "workers": self.workers,
+            "email": dict(self.email),
+            "addressee": list(self.addressee),
+            "allure_env": dict(self.allure_env),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            env=data["env"],
+            host=data["host"],
+            timeouts=Timeouts(**data["timeouts"]),
+            workers=data["workers"],
+            email=MappingProxyType(dict(data["email"])),
+            addressee=tuple(data["addressee"]),
+            allure_env=MappingProxyType(dict(data["allure_env"])),
+        )
+
+
+def _defaults():
+    """layer 1: the constants in configs.py, their types decide how the other layers are converted"""
+    return {
+        "HOST": {"host": ""},
+        "TIMEOUTS": {
+            "mini": float(configs.MINI_TIMEOUT),
+            "small": float(configs.SMALL_TIMEOUT),
+            "large": float(configs.LARGE_TIMEOUT),
+            "extreme": float(configs.EXTREME_TIMEOUT),
+            "poll_frequency": float(configs.POLL_FREQUENCY),
+            "page_refresh": float(configs.PAGE_REFRESH_TIMEOUT),
+        },
+        "RUN": {"workers": 0},
+        "EMAIL": dict(configs.EMAIL_INFO, addressee=",".join(configs.ADDRESSEE)),
+        "ALLURE_ENVIRONMENT": {},
+    }
+
+
+def _convert(raw, default):
+    """convert a string from an ini file/env var to the type of the default value"""
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    return raw
+
+
+def _merge_ini(layers, path):
+    """layer 2/3: ini files, unknown sections are kept as plain strings"""
+    parser = configparser.RawConfigParser()  # 当有%的符号时请使用Raw读取
+    parser.read(path, encoding='utf-8')
+    for section in parser.sections():
+        values = layers.setdefault(section, {})
+        for option, raw in parser.items(section):
+            values[option] = _convert(raw, values.get(option, ""))
+
+
+def _merge_environ(layers, environ):
+    """layer 4: PYTEST_DEMO_<SECTION>_<OPTION> environment variables, only for known options"""
+    for section, values in layers.items():
+        for option in values:
+            key = "%s%s_%s" % (ENV_PREFIX, section, option.upper())
+            if key in environ:
+                values[option] = _convert(environ[key], values[option])
+
+
+def env_overlay_file(env):
+    return os.path.join(pm.CONFIG_PATH, "env", "%s.ini" % env)
+
+
+def load_settings(env=None, environ=None):
+    """
+    merge all layers into a frozen snapshot
+    @param env: the --test_env value, defaults to $PYTEST_DEMO_ENV or devLocal
+    @param environ: mapping of environment variables (Default: os.environ)
+    """
+    environ = os.environ if environ is None else environ
+    env = env or environ.get(ENV_PREFIX + "ENV") or configs.Environment.DEVLOCAL
+    layers = _defaults()
+    _merge_ini(layers, pm.ini_file)
+    overlay = env_overlay_file(env)
+    if os.path.exists(overlay):
+        _merge_ini(layers, overlay)
+    _merge_environ(layers, environ)
+
+    email = dict(layers["EMAIL"])
+    addressee = tuple(a.strip() for a in email.pop("addressee").split(",") if a.strip())
+    return Settings(
+        env=env,
+        host=layers["HOST"]["host"],
+        timeouts=Timeouts(**layers["TIMEOUTS"]),
+        workers=layers["RUN"]["workers"],
+        email=MappingProxyType(email),
+        addressee=addressee,
+        allure_env=MappingProxyType(dict(layers["ALLURE_ENVIRONMENT"])),
+    )
+
+
+_current: Optional[Settings] = None
+
+
+def activate(settings):
+    """make the snapshot the one returned by get_settings(), called once per session by conftest"""
+    global _current
+    _current = settings
+    return settings
+
+
+def get_settings():
+    """the active snapshot, built from the default environment on first use outside pytest"""
+    if _current is None:
+        return activate(load_settings())
+    return _current
+
+
+if __name__ == '__main__':
+    print(get_settings())
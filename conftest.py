@@ -2,14 +2,20 @@
 # -*- coding:utf-8 -*-
 import base64
 import os
+import re
+import shutil
+import uuid
 import pytest
 import allure
 from py.xml import html
 
 from config import configs
 from config.path_manager import pm
+from config import settings as cfg
 from common.readconfig import ini
-from utils.logger import log
+from common.lazy_driver import LazyDriver
+from utils.logger import log, log_backend, set_test_id, reset_test_id
+from utils.log_merge import merge_shard_dir
 from utils.time import timestamp
 from utils.send_mail import send_report
 
@@ -19,6 +25,8 @@ from selenium.webdriver.firefox.options import Options as FO
 from selenium.webdriver.ie.options import Options as IEO
 
 driver = None
+# nodeid of the running test, for LazyDriver.used_by
+current_test = None
 
 
 def pytest_addoption(parser):
@@ -68,47 +76,87 @@ def pytest_addoption(parser):
                 Example: (--test_env=devInt)""",
     )
 
+    # 是否保留xdist worker的日志分片
+    parser.addoption(
+        "--keep_log_shards",
+        action="store_true",
+        dest="keep_log_shards",
+        default=False,
+        help="""Keep the per worker log shards under logs/<run id>/
+                after they are merged into the session log.
+                Default: the shard directory is removed after a successful merge.""",
+    )
 
-@pytest.fixture(scope='session', autouse=True)
-def drivers(request):
-    global driver
-    browser = request.config.getoption("browser")
+
+def _launch_browser(config):
+    """start the browser selected by --br/--is_headless"""
+    browser = config.getoption("browser")
     # headless or not
-    headless = request.config.getoption("headless")
+    headless = config.getoption("headless")
     log.info(f"get arguments：{browser}")
     log.info(f"get arguments：{headless}")
+    _driver = None
     if not headless:
         if browser == "chrome":
-            driver = webdriver.Chrome(pm.chrome_executable_path("97.0.4692.71"))
+            _driver = webdriver.Chrome(pm.chrome_executable_path("97.0.4692.71"))
         elif browser == "firefox":
-            driver = webdriver.Firefox()
+            _driver = webdriver.Firefox()
         elif browser == "ie":
-            driver = webdriver.Ie()
+            _driver = webdriver.Ie()
         else:
             log.info(f"发送错误浏览器参数：{browser}")
     else:
         if browser == "chrome":
             chrome_options = CO()
             chrome_options.add_argument('--headless')
-            driver = webdriver.Chrome(chrome_options=chrome_options)
+            _driver = webdriver.Chrome(chrome_options=chrome_options)
         elif browser == "firefox":
             firefox_options = FO()
             firefox_options.add_argument('--headless')
-            driver = webdriver.Firefox(firefox_options=firefox_options)
+            _driver = webdriver.Firefox(firefox_options=firefox_options)
         elif browser == "ie":
             ie_options = IEO()
             ie_options.add_argument('--headless')
-            driver = webdriver.Ie(ie_options=ie_options)
+            _driver = webdriver.Ie(ie_options=ie_options)
         else:
             log.info(f"发送错误浏览器参数：{browser}")
 
-    driver.set_page_load_timeout(configs.EXTREME_TIMEOUT)
-    driver.set_script_timeout(configs.EXTREME_TIMEOUT)
-    driver.maximize_window()
+    timeouts = cfg.get_settings().timeouts
+    _driver.set_page_load_timeout(timeouts.extreme)
+    _driver.set_script_timeout(timeouts.extreme)
+    _driver.maximize_window()
+    return _driver
+
+
+@pytest.fixture(scope='session')
+def drivers(request):
+    """
+    lazy driver: the browser starts when a test or page object first uses it,
+    tests that do not request this fixture never start a browser
+    """
+    global driver
+    driver = LazyDriver(lambda: _launch_browser(request.config))
+    driver.current_test = current_test
     yield driver
-    # driver.close()
+    if driver.started:
+        log.info(f"the browser was used by {len(driver.used_by)} test(s)")
     driver.quit()
-    # return driver
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """
+    give every test a correlation id, so its log lines can be grepped out of the JSON log file
+    """
+    global current_test
+    token = set_test_id(uuid.uuid4().hex[:8])
+    log.info("start test: %s", item.nodeid)
+    current_test = item.nodeid
+    if driver is not None:
+        driver.current_test = current_test
+    yield
+    pm.clear_scratch()
+    reset_test_id(token)
 
 
 @pytest.hookimpl(hookwrapper=True)
@@ -126,7 +174,13 @@ def pytest_runtest_makereport(item):
     if report.when == 'call' or report.when == "setup":
         xfail = hasattr(report, 'wasxfail')
         if (report.skipped and xfail) or (report.failed and not xfail):
-            screen_img = _capture_screenshot()
+            screen_img = None
+            if driver is not None and driver.started:
+                screen_img = _capture_screenshot()
+                _capture_page_source()
+            scratch = pm.persist_scratch(re.sub(r'\W+', '_', item.nodeid))
+            if scratch:
+                log.info(f"transient artifacts of the failed test are kept in {scratch}")
             if screen_img:
                 html = '<div><img src="data:image/png;base64,%s" alt="screenshot" style="width:1024px;height:768px;" ' \
                        'onclick="window.open(this.src)" align="right"/></div>' % screen_img
@@ -156,7 +210,31 @@ def pytest_html_results_table_html(report, data):
 #     report.title = "pytest demo report"
 
 
+@pytest.hookimpl(tryfirst=True)
+def pytest_cmdline_main(config):
+    """
+    build the settings snapshot for --test_env once, and use its worker count
+    as the default of xdist's -n when -n is not given on the command line
+    xdist workers run this hook too (with numprocesses reset to None), they must neither
+    re-parse the config nor set -n, otherwise every worker would start workers of its own
+    """
+    if False:
+        return
+    settings = cfg.activate(cfg.load_settings(config.getoption("env")))
+    if settings.workers and getattr(config.option, "numprocesses", "missing") is None:
+        config.option.numprocesses = settings.workers
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """xdist controller: hand the snapshot to the worker, so it does not parse the config files again"""
+    node.workerinput["settings"] = cfg.get_settings().to_dict()
+
+
 def pytest_configure(config):
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput and "settings" in workerinput:
+        cfg.activate(cfg.Settings.from_dict(workerinput["settings"]))
     config._metadata.clear()
     config._metadata['测试项目'] = "Pytest Demo Presentation"
     config._metadata['测试地址'] = ini.url
@@ -168,6 +246,21 @@ def pytest_html_results_summary(prefix, summary, postfix):
     prefix.extend([html.p("Tester: George")])
 
 
+def pytest_sessionfinish(session):
+    """
+    xdist worker: flush its log shard before reporting back to the controller
+    controller: merge the worker shards into one session log ordered by timestamp
+    """
+    pm.remove_scratch()
+    if pm.is_worker:
+        log_backend.stop()
+    elif os.path.isdir(pm.log_shard_dir):
+        lines = merge_shard_dir(pm.log_shard_dir, pm.session_log_file)
+        log.info(f"merged {lines} worker log lines into {pm.session_log_file}")
+        if lines and not session.config.getoption("keep_log_shards"):
+            shutil.rmtree(pm.log_shard_dir, ignore_errors=True)
+
+
 def pytest_terminal_summary(terminalreporter, exitstatus, config):
     """收集测试结果"""
     result = {
@@ -194,3 +287,13 @@ def _capture_screenshot():
     with open(screen_file, 'rb') as f:
         imagebase64 = base64.b64encode(f.read())
     return imagebase64.decode()
+
+
+def _capture_page_source():
+    """失败时保存页面源码"""
+    now_time, source_file = pm.page_source_path
+    with open(source_file, 'w', encoding='utf-8') as f:
+        f.write(driver.page_source)
+    allure.attach.file(source_file,
+                       f"失败页面源码{now_time}",
+                       allure.attachment_type.HTML)
@@ -5,6 +5,7 @@ selenium基类
 本文件存放了selenium基类的封装方法
 """
 import json
+import os
 import re
 import sys
 
@@ -29,6 +30,7 @@ from selenium.common.exceptions import (
 from utils import css_to_xpath, time
 from config import configs
 from config.path_manager import pm
+from config.settings import get_settings
 from page import page_utils
 import logging
 
@@ -45,9 +47,10 @@ class BasePage(object):
         self.driver = driver
         self.environment = None
         self.env = None  # Add a shortened version of self.environment
-        self.poll_frequency = configs.POLL_FREQUENCY
-        self.timeout = configs.LARGE_TIMEOUT
-        self.wait = WebDriverWait(self.driver, self.timeout)  # define WebDriverWait()
+        self.timeouts = get_settings().timeouts  # read once, not in every action
+        self.poll_frequency = self.timeouts.poll_frequency
+        self.timeout = self.timeouts.large
+        self.wait = WebDriverWait(self.driver, self.timeout, self.poll_frequency)  # define WebDriverWait()
 
     ############
 
@@ -58,7 +61,7 @@ class BasePage(object):
         open the url
         @param url:target url to test
         """
-        self.driver.implicitly_wait(configs.LARGE_TIMEOUT)
+        self.driver.implicitly_wait(self.timeout)
         try:
             self.driver.get(url)
             log.info("opening website：%s" % url)
@@ -336,13 +339,13 @@ class BasePage(object):
         try:
             return page_utils.hover_on_element(self.driver, selector)
         except WebDriverException as e:
-            driver_capabilities = self.driver.__dict__["capabilities"]
+            driver_capabilities = self.driver.capabilities
             if "version" in driver_capabilities:
                 chrome_version = driver_capabilities["version"]
             else:
                 chrome_version = driver_capabilities["browserVersion"]
             major_chrome_version = chrome_version.split(".")[0]
-            chrome_dict = self.driver.__dict__["capabilities"]["chrome"]
+            chrome_dict = driver_capabilities["chrome"]
             chromedriver_version = chrome_dict["chromedriverVersion"]
             chromedriver_version = chromedriver_version.split(" ")[0]
             major_chromedriver_version = chromedriver_version.split(".")[0]
@@ -1306,7 +1309,7 @@ class BasePage(object):
 
     # screenshots
 
-    def save_screenshot(self, name, folder=None, selector=None, by=By.CSS_SELECTOR):
+    def save_screenshot(self, name, folder=None, selector=None, by=By.CSS_SELECTOR, scratch=False):
         """
         Saves a screenshot of the current page.
         If no folder is specified, uses the folder where pytest was called.
@@ -1314,7 +1317,12 @@ class BasePage(object):
         If a provided selector is not found, then takes a full-page screenshot.
         If the folder provided doesn't exist, it will get created.
         The screenshot will be in PNG format: (*.png)
+        If "scratch" is True, the file goes to the RAM backed scratch directory
+        and is only copied to disk when the test fails.
         """
+        if scratch:
+            folder = None
+            name = self.__scratch_file(name, "screenshots", "png")
         if selector and by:
             selector, by = self.__recalculate_selector(selector, by)
             if page_utils.is_element_present(self.driver, selector, by):
@@ -1323,15 +1331,23 @@ class BasePage(object):
                 )
         return page_utils.save_screenshot(self.driver, name, folder)
 
-    def save_page_source(self, name, folder=None):
+    def save_page_source(self, name, folder=None, scratch=False):
         """Saves the page HTML to the current directory (or given subfolder).
         If the folder specified doesn't exist, it will get created.
         @Params
         name - The file name to save the current page's HTML to.
         folder - The folder to save the file to. (Default = current folder)
+        scratch - save to the scratch directory, kept only if the test fails
         """
+        if scratch:
+            folder = None
+            name = self.__scratch_file(name, "page_sources", "html")
         return page_utils.save_page_source(self.driver, name, folder)
 
+    @staticmethod
+    def __scratch_file(name, kind, ext):
+        _, path = pm.artifact_path(kind, ext, scratch=True)
+        return os.path.join(os.path.dirname(path), "%s_%s" % (name, os.path.basename(path)))
 
 if __name__ == "__main__":
     pass
@@ -1,38 +1,267 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
+"""
+locator linting for the yaml files in page_element
+
+* css is parsed and translated by cssselect (the machinery behind utils.css_to_xpath)
+* xpath is compiled by lxml when it is installed, otherwise a bracket/quote balance check is used
+* duplicated locators and brittle absolute paths are reported as warnings
+* optionally every locator is evaluated against saved page snapshots (*.html, needs lxml)
+* files are linted in a process pool and the results are cached by file hash,
+  so unchanged files are skipped on the next run
+"""
+import hashlib
+import json
 import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
 import yaml
+from cssselect import SelectorError
 
 from config import configs
 from config.path_manager import pm
+from utils.css_to_xpath import ConvertibleToCssTranslator
 from utils.time import running_time
 
+# bump when the rules change, so cached results are not reused
+LINT_VERSION = 1
+# more positional steps than this in one locator is considered brittle
+MAX_POSITIONAL_STEPS = 2
 
-@running_time
-def inspect_element():
+ERROR = "error"
+WARNING = "warning"
+
+
+def _issue(level, path, key, message):
+    return {"level": level, "file": os.path.basename(path), "key": key, "message": message}
+
+
+def _check_xpath(value):
+    """returns an error message, or None if the xpath is valid"""
+    try:
+        from lxml import etree
+    except ImportError:
+        etree = None
+    if etree is not None:
+        try:
+            etree.XPath(value)
+        except etree.XPathSyntaxError as e:
+            return str(e)
+        return None
+    # no lxml: at least brackets, parentheses and quotes have to be balanced
+    stack = []
+    quote = None
+    for char in value:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in "[(":
+            stack.append("]" if char == "[" else ")")
+        elif char in "])":
+            if not stack or stack.pop() != char:
+                return "unbalanced '%s'" % char
+    if quote or stack:
+        return "unclosed %s" % (quote or stack[-1])
+    return None
+
+
+def to_xpath(pattern, value):
+    """convert a locator of any supported type to xpath, used for the snapshot check"""
+    translator = ConvertibleToCssTranslator()
+    if pattern == "xpath":
+        return value
+    if pattern == "css":
+        return translator.css_to_xpath(value)
+    if pattern == "id":
+        return "//*[@id=%s]" % translator.xpath_literal(value)
+    if pattern == "name":
+        return "//*[@name=%s]" % translator.xpath_literal(value)
+    if pattern == "class":
+        return translator.css_to_xpath("." + value)
+    if pattern == "tag":
+        return "//" + value
+    if pattern == "link":
+        return "//a[normalize-space(.)=%s]" % translator.xpath_literal(value)
+    if pattern == "partial_link":
+        return "//a[contains(., %s)]" % translator.xpath_literal(value)
+    raise ValueError(pattern)
+
+
+def _brittle(pattern, value):
+    """returns the reason why the locator is brittle, or None"""
+    if pattern == "xpath":
+        if value.startswith("/html") or re.match(r"^/[^/]", value):
+            return "absolute xpath from the document root"
+        if len(re.findall(r"\[\d+\]", value)) > MAX_POSITIONAL_STEPS:
+            return "too many positional steps"
+    elif pattern == "css":
+        if value.lstrip().startswith("html") and ">" in value:
+            return "absolute css path from the document root"
+        if len(re.findall(r":nth-(?:child|of-type)\(", value)) > MAX_POSITIONAL_STEPS:
+            return "too many positional steps"
+    return None
+
+
+def lint_file(path, snapshots=()):
     """
+    lint one yaml file, runs in a worker process
+    @return: (issues, locators) locators is a list of [key, pattern, value] for the duplicate check
+    """
+    issues = []
+    locators = []
+    with open(path, encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    translator = ConvertibleToCssTranslator()
+    for key, k in data.items():
+        try:
+            pattern, value = str(k).split('==', 1)
+        except ValueError:
+            issues.append(_issue(ERROR, path, key, "no `==` in the element expression【%s】" % k))
+            continue
+        if pattern not in configs.LOCATE_MODE:
+            issues.append(_issue(ERROR, path, key, "There is not specific type of 【%s】" % k))
+            continue
+        if not value.strip():
+            issues.append(_issue(ERROR, path, key, "Element【%s】 has an empty value" % k))
+            continue
+        if pattern == 'xpath':
+            error = _check_xpath(value)
+            if error:
+                issues.append(_issue(ERROR, path, key, "Element【%s】 is not a valid xpath: %s" % (k, error)))
+                continue
+        elif pattern in ('css', 'class'):
+            try:
+                translator.css_to_xpath(value if pattern == 'css' else "." + value)
+            except SelectorError as e:
+                issues.append(_issue(ERROR, path, key, "Element【%s】 is not a valid css selector: %s" % (k, e)))
+                continue
+        reason = _brittle(pattern, value)
+        if reason:
+            issues.append(_issue(WARNING, path, key, "Element【%s】 is brittle: %s" % (k, reason)))
+        locators.append([key, pattern, value])
+    if snapshots:
+        issues.extend(_check_snapshots(path, locators, snapshots))
+    return issues, locators
+
+
+def _check_snapshots(path, locators, snapshots):
+    """every locator has to match at least one element in one of the snapshots"""
+    try:
+        from lxml import html
+    except ImportError:
+        return [_issue(WARNING, path, "-", "lxml is not installed, snapshot check skipped")]
+    trees = []
+    for snapshot in snapshots:
+        with open(snapshot, encoding='utf-8', errors='replace') as f:
+            trees.append(html.fromstring(f.read()))
+    issues = []
+    for key, pattern, value in locators:
+        xpath = to_xpath(pattern, value)
+        if not any(tree.xpath(xpath) for tree in trees):
+            issues.append(_issue(ERROR, path, key,
+                                 "Element【%s==%s】 matches nothing in the saved snapshots" % (pattern, value)))
+    return issues
+
 
-    Simple verify if the element is in correct format
-    Mainly checked xpath and css
+def _file_hash(path, salt):
+    digest = hashlib.sha1(salt.encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _cache_salt(snapshots):
+    """results are only valid for the same rules, the same lxml availability and the same snapshot files"""
+    try:
+        import lxml  # noqa
+        has_lxml = True
+    except ImportError:
+        has_lxml = False
+    digest = hashlib.sha1(("%s-%s" % (LINT_VERSION, has_lxml)).encode())
+    for snapshot in snapshots:
+        digest.update(os.path.basename(snapshot).encode())
+        with open(snapshot, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_file, cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+
+
+def _duplicates(results):
+    """the same locator under several keys/files"""
+    seen = defaultdict(list)
+    for path, (_, locators) in results.items():
+        for key, pattern, value in locators:
+            seen[(pattern, value)].append("%s:%s" % (os.path.basename(path), key))
+    return [_issue(WARNING, "-", ", ".join(places), "duplicated locator %s==%s" % (pattern, value))
+            for (pattern, value), places in seen.items() if len(places) > 1]
+
+
+@running_time
+def inspect_element(element_path=pm.ELEMENT_PATH, snapshot_dir=None, workers=None,
+                    cache_file=pm.LOCATOR_LINT_CACHE):
+    """
+    verify the locators in all yaml files under element_path
+    @param element_path: directory of the yaml files
+    @param snapshot_dir: directory of saved page snapshots (*.html) to evaluate the locators against
+    @param workers: size of the process pool (Default: cpu count)
+    @param cache_file: where the results are cached by file hash, None to disable the cache
+    @return: list of issues, raises AssertionError if any of them is an error
     """
-    for files in os.listdir(pm.ELEMENT_PATH):
-        if files.endswith(".yaml"):
-            _path = os.path.join(pm.ELEMENT_PATH, files)
-            with open(_path, encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-            for k in data.values():
-                try:
-                    pattern, value = k.split('==')
-                except ValueError:
-                    raise Exception("no `==` in the element expression")
-                if pattern not in configs.LOCATE_MODE:
-                    raise Exception('There is not specific type of 【%s】 in file %s' % (k, _path))
-                elif pattern == 'xpath':
-                    assert '/' in value, 'Element【%s】 in file %s is not in correct xpath format' % (k, _path)
-                elif pattern == 'css':
-                    assert '/' not in value, 'Element【%s】 in file %s is not in correct css format' % (k, _path)
-                else:
-                    assert value, 'Element【%s】 in file %s is not matching between its type and format' % (k, _path)
+    files = sorted(os.path.join(element_path, f) for f in os.listdir(element_path) if f.endswith(".yaml"))
+    snapshots = ()
+    if snapshot_dir:
+        snapshots = tuple(sorted(os.path.join(snapshot_dir, f)
+                                 for f in os.listdir(snapshot_dir) if f.endswith(".html")))
+    salt = _cache_salt(snapshots)
+    cache = _load_cache(cache_file) if cache_file else {}
+
+    results = {}
+    todo = []
+    for path in files:
+        digest = _file_hash(path, salt)
+        cached = cache.get(path)
+        if cached and cached["hash"] == digest:
+            results[path] = (cached["issues"], cached["locators"])
+        else:
+            todo.append((path, digest))
+
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(lint_file, path, snapshots) for path, _ in todo]
+            linted = [future.result() for future in futures]
+    else:
+        linted = [lint_file(path, snapshots) for path, _ in todo]
+    for (path, digest), (issues, locators) in zip(todo, linted):
+        results[path] = (issues, locators)
+        cache[path] = {"hash": digest, "issues": issues, "locators": locators}
+
+    if cache_file and todo:
+        _save_cache(cache_file, {path: cache[path] for path in files})
+    print("linted %s file(s), %s unchanged file(s) skipped" % (len(todo), len(files) - len(todo)))
+
+    issues = [issue for path in files for issue in results[path][0]] + _duplicates(results)
+    for issue in issues:
+        print("[%(level)s] %(file)s %(key)s: %(message)s" % issue)
+    errors = [issue for issue in issues if issue["level"] == ERROR]
+    assert not errors, "%s invalid locator(s) found" % len(errors)
+    return issues
 
 
 if __name__ == '__main__':
@@ -17,7 +17,7 @@ from page_object.searchpage import SearchPage
 @allure.link("https://www.baidu.com", name="连接跳转百度")
 @pytest.mark.demo
 class TestSearch:
-    @pytest.fixture(scope='function', autouse=True)
+    @pytest.fixture(scope='function')
     def open_baidu(self, drivers):
         """打开百度"""
         search = SearchPage(drivers)
@@ -26,6 +26,7 @@ class TestSearch:
     @allure.story("测试百度搜索selenium结果")
     @allure.severity("critical")
     @allure.testcase("https://www.confluence.xxx.com", name="测试用例位置")
+    @pytest.mark.usefixtures("open_baidu")
     def test_001(self, drivers):
         """测试百度搜索selenium结果"""
         search = SearchPage(drivers)
@@ -38,6 +39,7 @@ class TestSearch:
     @allure.story("测试搜索候选")
     @allure.severity("normal")
     @allure.testcase("https://www.confluence.xxx.com", name="测试用例位置")
+    @pytest.mark.usefixtures("open_baidu")
     def test_002(self, drivers):
         """测试搜索候选"""
         search = SearchPage(drivers)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+import gzip
+import json
+
+import pytest
+from utils.log_merge import shard_files, merge_logs, merge_shard_dir
+
+
+def _line(ts, msg):
+    return json.dumps({"ts": ts, "level": "INFO", "test_id": "-", "src": "x.py:1", "msg": msg}) + "\n"
+
+
+def _write_gz(path, *lines):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    """two worker shards, gw0 rotated twice (.2.gz is the oldest)"""
+    gw0 = tmp_path / "gw0.log"
+    _write_gz(str(gw0) + ".2.gz", _line(1.0, "gw0-a"), _line(4.0, "gw0-b"))
+    _write_gz(str(gw0) + ".1.gz", _line(5.0, "gw0-c"))
+    gw0.write_text(_line(8.0, "gw0-d"), encoding="utf-8")
+    (tmp_path / "gw1.log").write_text(_line(2.0, "gw1-a") + _line(6.0, "gw1-b") + _line(9.0, "gw1-c"),
+                                      encoding="utf-8")
+    return tmp_path
+
+
+class TestLogMerge:
+    def test_shard_files_oldest_first(self, shard_dir):
+        log_file = str(shard_dir / "gw0.log")
+        assert shard_files(log_file) == [log_file + ".2.gz", log_file + ".1.gz", log_file]
+
+    def test_merge_rotated_shards_by_timestamp(self, shard_dir, tmp_path_factory):
+        output = tmp_path_factory.mktemp("merged") / "session.log"
+        assert merge_shard_dir(str(shard_dir), str(output)) == 7
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["msg"] for line in lines] == \
+               ["gw0-a", "gw1-a", "gw0-b", "gw0-c", "gw1-b", "gw0-d", "gw1-c"]
+
+    def test_unparsable_line_keeps_its_position(self, tmp_path):
+        shard = tmp_path / "gw0.log"
+        shard.write_text(_line(1.0, "a") + "Traceback (most recent call last)\n" + _line(3.0, "b"),
+                         encoding="utf-8")
+        other = tmp_path / "gw1.log"
+        other.write_text(_line(2.0, "c"), encoding="utf-8")
+        output = tmp_path / "session.log"
+        assert merge_logs([str(shard), str(other)], str(output)) == 4
+        assert output.read_text(encoding="utf-8").splitlines()[1].startswith("Traceback")
+
+    def test_empty_shard_dir(self, tmp_path):
+        assert merge_shard_dir(str(tmp_path), str(tmp_path / "session.log")) == 0
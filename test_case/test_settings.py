@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+import dataclasses
+import os
+import subprocess
+import sys
+
+import pytest
+from config import settings as cfg
+from config.path_manager import pm
+
+
+@pytest.fixture
+def layers(tmp_path, monkeypatch):
+    """config.ini and an env overlay in a temporary directory"""
+    ini_file = tmp_path / "config.ini"
+    ini_file.write_text("[HOST]\nhost = https://base.example.com\n\n"
+                        "[TIMEOUTS]\nlarge = 20\nsmall = 3\n\n"
+                        "[ALLURE_ENVIRONMENT]\nversion = v1\n", encoding="utf-8")
+    overlay = tmp_path / "devInt.ini"
+    overlay.write_text("[HOST]\nhost = https://devint.example.com\n\n"
+                       "[TIMEOUTS]\nlarge = 15\n\n[RUN]\nworkers = 3\n", encoding="utf-8")
+    monkeypatch.setattr(pm, "ini_file", str(ini_file))
+    monkeypatch.setattr(cfg, "env_overlay_file", lambda env: str(tmp_path / ("%s.ini" % env)))
+    return tmp_path
+
+
+class TestSettings:
+    def test_defaults_and_config_ini(self, layers):
+        settings = cfg.load_settings("devLocal", environ={})
+        assert settings.host == "https://base.example.com"
+        assert settings.timeouts.large == 20.0
+        assert settings.timeouts.small == 3.0
+        # not in any ini file: the value of configs.py
+        assert settings.timeouts.extreme == float(cfg.configs.EXTREME_TIMEOUT)
+        assert settings.workers == 0
+        assert settings.allure_env["version"] == "v1"
+
+    def test_env_overlay_over_config_ini(self, layers):
+        settings = cfg.load_settings("devInt", environ={})
+        assert settings.env == "devInt"
+        assert settings.host == "https://devint.example.com"
+        assert settings.timeouts.large == 15.0
+        assert settings.timeouts.small == 3.0
+        assert settings.workers == 3
+
+    def test_environ_over_everything(self, layers):
+        environ = {
+            "PYTEST_DEMO_TIMEOUTS_LARGE": "7.5",
+            "PYTEST_DEMO_RUN_WORKERS": "2",
+            "PYTEST_DEMO_HOST_HOST": "https://env.example.com",
+            "PYTEST_DEMO_EMAIL_ADDRESSEE": "a@example.com, b@example.com,",
+        }
+        settings = cfg.load_settings("devInt", environ=environ)
+        assert settings.timeouts.large == 7.5
+        assert settings.workers == 2 and isinstance(settings.workers, int)
+        assert settings.host == "https://env.example.com"
+        assert settings.addressee == ("a@example.com", "b@example.com")
+
+    def test_env_selected_by_environ(self, layers):
+        assert cfg.load_settings(environ={"PYTEST_DEMO_ENV": "devInt"}).workers == 3
+
+    def test_bad_env_value(self, layers):
+        with pytest.raises(ValueError):
+            cfg.load_settings("devLocal", environ={"PYTEST_DEMO_RUN_WORKERS": "two"})
+
+    def test_snapshot_is_frozen_and_round_trips(self, layers):
+        settings = cfg.load_settings("devInt", environ={})
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            settings.host = "x"
+        with pytest.raises(TypeError):
+            settings.email["server"] = "x"
+        assert cfg.Settings.from_dict(settings.to_dict()) == settings
+
+    def test_workers_from_settings_do_not_recurse(self):
+        """
+        the worker count of the settings is used as -n, the xdist workers must not apply it again,
+        otherwise every worker starts workers of its own and the run never ends
+        """
+        env = {k: v for k, v in os.environ.items()
+               if not k.startswith(("PYTEST_XDIST_", "PYTEST_DEMO_"))}
+        env["PYTEST_DEMO_RUN_WORKERS"] = "2"
+        proc = subprocess.run(
+            [sys.executable, "-m", "pytest", "-p", "no:cacheprovider", "test_case/test_log_merge.py"],
+            cwd=pm.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, timeout=120)
+        assert proc.returncode == 0, proc.stdout
+        assert "gw1" in proc.stdout and "gw2" not in proc.stdout
+        assert "4 passed" in proc.stdout
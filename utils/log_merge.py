@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+合并xdist各worker的日志分片
+每个分片本身按时间有序, 用heapq.merge做流式k路归并, 不会把整个文件读进内存
+"""
+import glob
+import gzip
+import heapq
+import json
+import os
+import re
+
+
+def shard_files(log_file):
+    """
+    返回一个分片的所有文件, 从旧到新:
+    worker.log.N.gz ... worker.log.1.gz, worker.log
+    """
+    rotated = glob.glob(log_file + ".*.gz")
+    rotated.sort(key=lambda p: int(re.search(r"\.(\d+)\.gz$", p).group(1)), reverse=True)
+    if os.path.exists(log_file):
+        rotated.append(log_file)
+    return rotated
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_shard(log_file):
+    """按顺序逐行产出(ts, line), 无法解析的行沿用上一行的时间戳"""
+    ts = 0.0
+    for path in shard_files(log_file):
+        with _open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    ts = float(json.loads(line)["ts"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+                yield ts, line if line.endswith("\n") else line + "\n"
+
+
+def merge_logs(log_files, output):
+    """
+    按时间戳把多个分片归并到一个文件
+    :param log_files: 各分片的当前日志文件(滚动出的.gz会自动带上)
+    :param output: 合并后的文件
+    :return: 写入的行数
+    """
+    streams = [iter_shard(f) for f in log_files]
+    count = 0
+    with open(output, "w", encoding="utf-8") as out:
+        for _, line in heapq.merge(*streams, key=lambda x: x[0]):
+            out.write(line)
+            count += 1
+    return count
+
+
+def merge_shard_dir(shard_dir, output):
+    """合并一个目录下的所有分片(*.log)"""
+    log_files = sorted(glob.glob(os.path.join(shard_dir, "*.log")))
+    if not log_files:
+        return 0
+    return merge_logs(log_files, output)
@@ -1,38 +1,142 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
+import atexit
+import contextvars
+import copy
+import gzip
+import json
 import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import configs
 from config.path_manager import pm
 
+# 当前用例的关联ID, 由conftest在每个用例开始时设置
+_test_id = contextvars.ContextVar("test_id", default="-")
+
+
+def set_test_id(test_id):
+    """设置当前用例的关联ID, 返回用于reset_test_id的token"""
+    return _test_id.set(test_id)
+
+
+def reset_test_id(token):
+    _test_id.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """把当前用例的关联ID写到日志记录上"""
+
+    def filter(self, record):
+        record.test_id = _test_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行紧凑的JSON"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "test_id": getattr(record, "test_id", "-"),
+            "src": "%s:%d" % (record.filename, record.lineno),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler默认在调用线程里完整格式化记录,
+    这里只合并msg和args(参数可能在之后被修改), 格式化交给监听线程
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as sf, gzip.open(dest, "wb") as df:
+        shutil.copyfileobj(sf, df)
+    os.remove(source)
+
 
 class Log:
-    def __init__(self):
+    def __init__(self, level=configs.LOG_LEVEL):
         self.logger = logging.getLogger()
+        self.listener = None
+        self.queue_handler = None
+        self.sinks = ()
         if not self.logger.handlers:
-            self.logger.setLevel(logging.DEBUG)
+            # logger本身的级别就是生效级别, 低于该级别的调用在创建记录前就被丢弃
+            self.logger.setLevel(level)
 
-            # 创建一个handle写入文件
-            fh = logging.FileHandler(pm.log_file, encoding='utf-8')
-            fh.setLevel(logging.INFO)
+            # 创建一个handle写入文件, 按大小滚动并压缩旧文件
+            fh = RotatingFileHandler(pm.log_file,
+                                     maxBytes=configs.LOG_MAX_BYTES,
+                                     backupCount=configs.LOG_BACKUP_COUNT,
+                                     encoding='utf-8',
+                                     delay=True)
+            fh.namer = _gzip_namer
+            fh.rotator = _gzip_rotator
+            fh.setLevel(level)
+            fh.setFormatter(JsonFormatter())
 
             # 创建一个handle输出到控制台
             ch = logging.StreamHandler()
-            ch.setLevel(logging.INFO)
+            ch.setLevel(level)
+            ch.setFormatter(logging.Formatter(self.fmt))
 
-            # 定义输出的格式
-            formatter = logging.Formatter(self.fmt)
-            fh.setFormatter(formatter)
-            ch.setFormatter(formatter)
-
-            # 添加到handle
-            self.logger.addHandler(fh)
-            self.logger.addHandler(ch)
+            # 测试线程只负责入队, 写文件和输出控制台在监听线程完成
+            qh = DeferredQueueHandler(queue.SimpleQueue())
+            qh.addFilter(CorrelationFilter())
+            self.logger.addHandler(qh)
+            self.queue_handler = qh
+            self.sinks = (fh, ch)
+            self.listener = QueueListener(qh.queue, *self.sinks, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
 
     @property
     def fmt(self):
-        return '%(levelname)s\t%(asctime)s\t[%(filename)s:%(lineno)d]\t%(message)s'
+        return '%(levelname)s\t%(asctime)s\t[%(filename)s:%(lineno)d]\t[%(test_id)s]\t%(message)s'
+
+    def stop(self):
+        """
+        清空队列并停止监听线程, 之后的记录直接同步写到各个handler,
+        xdist的worker在会话结束时调用, 保证合并分片前日志已经落盘
+        """
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.sinks:
+            handler.addFilter(CorrelationFilter())
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                pass  # the console stream may be closed already at exit
+            self.logger.addHandler(handler)
 
 
-log = Log().logger
+log_backend = Log()
+log = log_backend.logger
 
 if __name__ == '__main__':
     log.info('hello world')
@@ -2,6 +2,7 @@
 # -*- coding:utf-8 -*-
 import zmail
 from config.path_manager import pm
+from config.settings import get_settings
 
 
 def send_report():
@@ -15,8 +16,9 @@ def send_report():
             'content_html': content_html,
             'attachments': [pm.REPORT_FILE, ]
         }
-        server = zmail.server(*pm.EMAIL_INFO.values())
-        server.send_mail(pm.ADDRESSEE, mail)
+        settings = get_settings()
+        server = zmail.server(*settings.email.values())
+        server.send_mail(list(settings.addressee), mail)
         print("测试邮件发送成功！")
     except Exception as e:
         print("Error: 无法发送邮件，{}！", format(e))